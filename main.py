@@ -2,6 +2,8 @@
 
 import os
 import time
+import select
+import signal
 import logging
 from npm_api_manager import NPMAPIManager
 from pihole_manager import PiHoleManager
@@ -13,6 +15,12 @@ class NPM2PiHole:
         self.load_config()
         self.validate_config()
 
+        # SIGHUP writes to this pipe to cut the current sleep short and re-check immediately;
+        # a pipe write takes no locks, so it is safe from a signal handler
+        self.wake_read_fd, self.wake_write_fd = os.pipe()
+        os.set_blocking(self.wake_read_fd, False)
+        os.set_blocking(self.wake_write_fd, False)
+
         # Initialize managers
         self.npm_manager = NPMAPIManager(
             self.logger,
@@ -28,22 +36,32 @@ class NPM2PiHole:
             self.logger,
             self.pihole_host,
             self.target_host,
-            self.testing_mode
+            self.testing_mode,
+            self.pihole_cache_ttl
         )
 
     def setup_logging(self):
         """Configure logging with Docker-friendly format"""
         # Create custom formatter that matches the original timestamp format
         class DockerFormatter(logging.Formatter):
+            def __init__(self):
+                super().__init__()
+                # Timestamp only changes once per second, so reuse it within that second
+                self._last_ts_int = None
+                self._last_ts_str = ''
+
             def format(self, record):
                 # Format: "Sat Dec 20 19:28:59 UTC 2025 - message"
-                from datetime import datetime
-                timestamp = datetime.now().strftime('%a %b %d %H:%M:%S UTC %Y')
-                return f"{timestamp} - {record.getMessage()}"
+                ts_int = int(record.created)
+                if ts_int != self._last_ts_int:
+                    self._last_ts_str = time.strftime('%a %b %d %H:%M:%S UTC %Y', time.gmtime(ts_int))
+                    self._last_ts_int = ts_int
+                return f"{self._last_ts_str} - {record.getMessage()}"
 
         # Configure root logger
         logger = logging.getLogger()
-        logger.setLevel(logging.INFO)
+        log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+        logger.setLevel(logging.getLevelNamesMapping().get(log_level, logging.INFO))
 
         # Create console handler with custom formatter
         handler = logging.StreamHandler()
@@ -64,6 +82,7 @@ class NPM2PiHole:
         self.npm_certificate_id = int(os.getenv('NPM_CERTIFICATE_ID', '1'))
         self.testing_mode = os.getenv('TESTING_MODE', 'false').lower() == 'true'
         self.sleep_interval = int(os.getenv('SLEEP_INTERVAL', 900))
+        self.pihole_cache_ttl = int(os.getenv('PIHOLE_CACHE_TTL', 3600))
 
     def validate_config(self):
         """Validate configuration"""
@@ -101,6 +120,28 @@ class NPM2PiHole:
         else:
             self.logger.warning("No domains configured, nothing to do")
 
+    def handle_sighup(self, signum, frame):
+        """Trigger an immediate check on SIGHUP"""
+        try:
+            os.write(self.wake_write_fd, b'\0')
+        except BlockingIOError:
+            pass  # A wake-up is already pending
+
+    def wait_until(self, deadline: float) -> bool:
+        """Sleep until the monotonic deadline, returning True if woken early by SIGHUP"""
+        readable, _, _ = select.select([self.wake_read_fd], [], [], max(0, deadline - time.monotonic()))
+        if not readable:
+            return False
+
+        # Drain every pending wake-up so several signals trigger a single check
+        try:
+            while os.read(self.wake_read_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        self.logger.info("Received SIGHUP, running check now")
+        return True
+
     def run(self):
         """Main run loop"""
         self.logger.info("Starting")
@@ -108,17 +149,25 @@ class NPM2PiHole:
             self.logger.info("*** TESTING MODE ENABLED - No changes will be applied ***")
         self.logger.info(f"Check interval: {self.sleep_interval} seconds")
 
+        signal.signal(signal.SIGHUP, self.handle_sighup)
+
+        # Schedule checks against a fixed deadline so check duration doesn't add drift
+        next_deadline = time.monotonic()
         while True:
             try:
                 self.run_check()
-                self.logger.info(f"Sleeping for {self.sleep_interval} seconds...")
-                time.sleep(self.sleep_interval)
+                # If a check overran the interval, run the next one now rather than catching up
+                next_deadline = max(next_deadline + self.sleep_interval, time.monotonic())
+                self.logger.info(f"Sleeping for {max(0, round(next_deadline - time.monotonic()))} seconds...")
+                if self.wait_until(next_deadline):
+                    next_deadline = time.monotonic()
             except KeyboardInterrupt:
                 self.logger.info("Shutting down...")
                 break
             except Exception as e:
                 self.logger.error(f"Error in main loop: {e}")
-                time.sleep(60)  # Wait a minute before retrying
+                self.wait_until(time.monotonic() + 60)  # Wait a minute before retrying
+                next_deadline = time.monotonic()
 
 
 if __name__ == "__main__":
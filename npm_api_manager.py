@@ -3,23 +3,62 @@
 import os
 import requests
 import json
-from typing import Set, Dict, List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Set, Dict, List, Optional, Tuple
+
+# Concurrent create/delete calls per sync; stays within the HTTPAdapter pool size
+SYNC_MAX_WORKERS = 8
+
+# Fixed fields of every proxy host we create; per-host and mutable fields are added in create_proxy_host
+PROXY_HOST_TEMPLATE = {
+    "forward_scheme": "http",
+    "access_list_id": 0,
+    "caching_enabled": False,
+    "block_exploits": False,
+    "allow_websocket_upgrade": True,
+    "ssl_forced": True,
+    "http2_support": True,
+    "hsts_enabled": False,
+    "hsts_subdomains": False,
+    "advanced_config": ""
+}
 
 
 class NPMAPIManager:
     """Manages Nginx Proxy Manager operations via API"""
 
-    def __init__(self, logger, domain_suffix: str, npm_host: str, npm_email: str, npm_password: str, certificate_id: int = 1, testing_mode: bool = False):
+    def __init__(self, logger, domain_suffix: str, npm_host: str, npm_email: str, npm_password: str, certificate_id: int = 1, testing_mode: bool = False, timeout: Tuple[float, float] = (3.05, 30)):
         self.logger = logger
-        self.domain_suffix = domain_suffix
+        self.domain_suffix = domain_suffix.lower()
         self.npm_host = npm_host
         self.npm_email = npm_email
         self.npm_password = npm_password
         self.certificate_id = certificate_id
         self.testing_mode = testing_mode
+        # (connect, read) timeouts: fail fast on an unreachable NPM, allow slow responses
+        self._timeout = timeout
         self.base_url = f"http://{npm_host}/api"
         self.token = None
         self.token_expires = None
+        # Serializes token refreshes across the sync worker threads
+        self._token_lock = threading.Lock()
+
+        # Reuse connections to NPM across API calls, retrying transient failures with backoff.
+        # POST is not retried so a create that failed after reaching NPM is not duplicated.
+        retry = Retry(
+            total=3,
+            backoff_factor=1.0,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "PUT", "DELETE"],
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self._session = requests.Session()
+        self._session.headers.update({"Content-Type": "application/json"})
+        self._session.mount(f"http://{npm_host}", HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=16))
 
     def _get_auth_token(self) -> bool:
         """Get JWT token from NPM API"""
@@ -34,10 +73,10 @@ class NPMAPIManager:
                 "secret": self.npm_password
             }
 
-            response = requests.post(
+            response = self._session.post(
                 f"{self.base_url}/tokens",
                 json=auth_data,
-                timeout=30
+                timeout=self._timeout
             )
 
             if response.status_code == 200:
@@ -54,46 +93,46 @@ class NPMAPIManager:
             self.logger.error(f"Error authenticating with NPM API: {e}")
             return False
 
+    def _current_token(self) -> Optional[str]:
+        """Return the current token, authenticating first if there is none"""
+        with self._token_lock:
+            if not self.token:
+                self._get_auth_token()
+            return self.token
+
+    def _refresh_token(self, stale_token: str) -> Optional[str]:
+        """Replace a rejected token, unless another thread already has"""
+        with self._token_lock:
+            if self.token == stale_token:
+                self.logger.info("Token expired, refreshing...")
+                self.token = None
+                self._get_auth_token()
+            return self.token
+
     def _make_api_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Optional[Dict]:
         """Make authenticated API request to NPM"""
-        if not self.token and not self._get_auth_token():
+        token = self._current_token()
+        if not token:
             return None
 
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
+        method = method.upper()
+        url = f"{self.base_url}{endpoint}"
 
         try:
-            if method.upper() == "GET":
-                response = requests.get(f"{self.base_url}{endpoint}", headers=headers, timeout=30)
-            elif method.upper() == "POST":
-                response = requests.post(f"{self.base_url}{endpoint}", headers=headers, json=data, timeout=30)
-            elif method.upper() == "PUT":
-                response = requests.put(f"{self.base_url}{endpoint}", headers=headers, json=data, timeout=30)
-            elif method.upper() == "DELETE":
-                response = requests.delete(f"{self.base_url}{endpoint}", headers=headers, timeout=30)
-            else:
-                self.logger.error(f"Unsupported HTTP method: {method}")
-                return None
+            response = self._session.request(
+                method, url, json=data, headers={"Authorization": f"Bearer {token}"}, timeout=self._timeout
+            )
 
             if response.status_code in [200, 201]:
                 return response.json() if response.text else {}
             elif response.status_code in [400, 401]:
                 # Token expired, try to refresh
-                self.logger.info("Token expired, refreshing...")
-                self.token = None
-                if self._get_auth_token():
-                    headers["Authorization"] = f"Bearer {self.token}"
+                token = self._refresh_token(token)
+                if token:
                     # Retry the request
-                    if method.upper() == "GET":
-                        response = requests.get(f"{self.base_url}{endpoint}", headers=headers, timeout=30)
-                    elif method.upper() == "POST":
-                        response = requests.post(f"{self.base_url}{endpoint}", headers=headers, json=data, timeout=30)
-                    elif method.upper() == "PUT":
-                        response = requests.put(f"{self.base_url}{endpoint}", headers=headers, json=data, timeout=30)
-                    elif method.upper() == "DELETE":
-                        response = requests.delete(f"{self.base_url}{endpoint}", headers=headers, timeout=30)
+                    response = self._session.request(
+                        method, url, json=data, headers={"Authorization": f"Bearer {token}"}, timeout=self._timeout
+                    )
 
                     if response.status_code in [200, 201]:
                         return response.json() if response.text else {}
@@ -108,6 +147,10 @@ class NPMAPIManager:
             self.logger.error(f"Error making API request: {e}")
             return None
 
+    def close(self):
+        """Close pooled connections to NPM"""
+        self._session.close()
+
     def get_existing_proxy_hosts(self) -> List[Dict]:
         """Get all existing proxy hosts from NPM"""
         if self.testing_mode:
@@ -131,21 +174,12 @@ class NPMAPIManager:
 
         # Payload structure matches the captured request exactly
         payload = {
+            **PROXY_HOST_TEMPLATE,
             "domain_names": domain_names,
-            "forward_scheme": "http",
             "forward_host": forward_host,
             "forward_port": forward_port,
-            "access_list_id": 0,
-            "caching_enabled": False,
-            "block_exploits": False,
-            "allow_websocket_upgrade": True,
-            "locations": [],
             "certificate_id": self.certificate_id,
-            "ssl_forced": True,
-            "http2_support": True,
-            "hsts_enabled": False,
-            "hsts_subdomains": False,
-            "advanced_config": "",
+            "locations": [],
             "meta": {}
         }
 
@@ -191,21 +225,26 @@ class NPMAPIManager:
                     continue
 
                 # Validate data types
-                if not isinstance(service['domain_names'], list) or not service['domain_names']:
+                if (not isinstance(service['domain_names'], list) or not service['domain_names']
+                        or not all(isinstance(name, str) for name in service['domain_names'])):
                     self.logger.warning(f"Invalid domain_names for service: {service}")
                     continue
 
+                # DNS names are case-insensitive and NPM stores them lower-cased
+                domain_names = [name.strip().lower() for name in service['domain_names']]
+
                 try:
                     port = int(service['forward_port'])
 
                     # Create a single service entry with multiple domain names
                     services.append({
-                        "domain_names": service['domain_names'],
+                        "domain_names": domain_names,
+                        "full_domain_names": [f"{name}.{self.domain_suffix}" for name in domain_names],
                         "forward_host": service['forward_host'],
                         "forward_port": port,
                         "description": service.get('description', '')
                     })
-                    domains_str = ", ".join(service['domain_names'])
+                    domains_str = ", ".join(domain_names)
                     self.logger.info(f"Loaded service: [{domains_str}] -> {service['forward_host']}:{port}")
 
                 except (ValueError, TypeError):
@@ -235,12 +274,12 @@ class NPMAPIManager:
         # Get existing proxy hosts
         existing_hosts = self.get_existing_proxy_hosts()
 
-        # Build expected domains with domain suffix
-        all_expected_domains = set()
-        for service in services:
-            for domain_name in service['domain_names']:
-                full_domain = f"{domain_name}.{self.domain_suffix}"
-                all_expected_domains.add(full_domain)
+        # Collect expected domains (already suffixed by the loader)
+        all_expected_domains = {
+            full_domain
+            for service in services
+            for full_domain in service['full_domain_names']
+        }
 
         # Find existing domains mapped to their host IDs
         existing_domain_to_host = {}
@@ -249,27 +288,32 @@ class NPMAPIManager:
                 existing_domain_to_host[domain] = host['id']
 
         # Delete proxy hosts that shouldn't exist anymore
-        hosts_to_delete = set()
-        for domain, host_id in existing_domain_to_host.items():
-            if domain not in all_expected_domains:
-                hosts_to_delete.add(host_id)
-
-        for host_id in hosts_to_delete:
-            self.logger.info(f"Removing unused proxy host ID: {host_id}")
-            self.delete_proxy_host(host_id)
+        hosts_to_delete = {
+            existing_domain_to_host[domain]
+            for domain in existing_domain_to_host.keys() - all_expected_domains
+        }
 
-        # Create new proxy hosts for each service
+        # Find services with none of their domains configured yet
+        services_to_create = []
         for service in services:
-            # Build full domain names with suffix
-            full_domain_names = [f"{name}.{self.domain_suffix}" for name in service['domain_names']]
-
-            # Check if any of these domains already exist
-            domains_exist = any(domain in existing_domain_to_host for domain in full_domain_names)
-
-            if not domains_exist:
+            # Only create if none of these domains already exist
+            if existing_domain_to_host.keys().isdisjoint(service['full_domain_names']):
+                services_to_create.append((service['full_domain_names'], service['forward_host'], service['forward_port']))
+
+        # Run the independent API calls concurrently; deletes finish before creates start
+        with ThreadPoolExecutor(max_workers=SYNC_MAX_WORKERS) as executor:
+            for host_id in hosts_to_delete:
+                self.logger.info(f"Removing unused proxy host ID: {host_id}")
+            list(executor.map(self.delete_proxy_host, hosts_to_delete))
+
+            futures = []
+            for full_domain_names, forward_host, forward_port in services_to_create:
                 domains_str = ", ".join(full_domain_names)
                 self.logger.info(f"Creating new proxy host: [{domains_str}]")
-                self.create_proxy_host(full_domain_names, service['forward_host'], service['forward_port'])
+                futures.append(executor.submit(self.create_proxy_host, full_domain_names, forward_host, forward_port))
+            for future in futures:
+                future.result()
 
         self.logger.info(f"Proxy host synchronization complete. Configured {len(all_expected_domains)} domains")
+        self.close()
         return all_expected_domains
\ No newline at end of file
@@ -1,18 +1,35 @@
 #!/usr/bin/env python3
 
+import logging
 import os
+import re
+import shlex
 import subprocess
+import time
 from typing import Set
 
+# A CNAME record in Pi-hole's "[ domain1,target1, domain2,target2 ]" output, quoted or not
+_PIHOLE_REC_RE = re.compile(r'[^\s,\[\]"]+(?:,[^\s,\[\]"]+)+')
+
+# Control socket shared by all SSH commands so they reuse one connection
+SSH_CONTROL_PATH = '/tmp/npm2pihole-ssh.sock'
+# Seconds to wait for the Pi-hole to accept a new SSH connection
+SSH_CONNECT_TIMEOUT = 10
+
 
 class PiHoleManager:
     """Manages Pi-hole operations including SSH connection, CNAME record management, and service restarts"""
 
-    def __init__(self, logger, pihole_host: str, target_host: str, testing_mode: bool = False):
+    def __init__(self, logger, pihole_host: str, target_host: str, testing_mode: bool = False, cache_ttl: int = 3600):
         self.logger = logger
         self.pihole_host = pihole_host
         self.target_host = target_host
         self.testing_mode = testing_mode
+        self.cache_ttl = cache_ttl
+
+        # CNAME records last fetched from or pushed to the Pi-hole, trusted for cache_ttl seconds
+        self._cached_existing = None
+        self._cached_existing_ts = 0.0
 
         self.setup_ssh()
 
@@ -31,19 +48,66 @@ class PiHoleManager:
             self.logger.info("Then restart this container.")
             exit(1)
 
-        # Add host to known_hosts
+        # Add host to known_hosts unless it is already there
+        known_hosts_path = '/root/.ssh/known_hosts'
         try:
-            subprocess.run([
-                'ssh-keyscan', '-H', self.pihole_host
-            ], stdout=open('/root/.ssh/known_hosts', 'a'), stderr=subprocess.DEVNULL)
+            known = subprocess.run([
+                'ssh-keygen', '-F', self.pihole_host, '-f', known_hosts_path
+            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            if known.returncode != 0:
+                with open(known_hosts_path, 'a') as known_hosts:
+                    subprocess.run([
+                        'ssh-keyscan', '-H', self.pihole_host
+                    ], stdout=known_hosts, stderr=subprocess.DEVNULL)
         except:
             pass  # Ignore errors, key might already exist
 
+        self.open_ssh_master()
+
+    def open_ssh_master(self) -> bool:
+        """Make sure a background SSH master connection is available for commands to reuse"""
+        try:
+            # A live master answers the check locally, without a new connection
+            check = subprocess.run([
+                'ssh', '-O', 'check', '-o', f'ControlPath={SSH_CONTROL_PATH}', self.pihole_host
+            ], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+            if check.returncode == 0:
+                return True
+
+            # Clear a socket left behind by a master that died
+            if os.path.exists(SSH_CONTROL_PATH):
+                os.remove(SSH_CONTROL_PATH)
+
+            result = subprocess.run([
+                'ssh', '-M', '-N', '-f',
+                '-o', f'ControlPath={SSH_CONTROL_PATH}',
+                '-o', f'ConnectTimeout={SSH_CONNECT_TIMEOUT}',
+                '-o', 'BatchMode=yes',
+                '-o', 'ServerAliveInterval=60',
+                self.pihole_host
+            ], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=SSH_CONNECT_TIMEOUT + 5)
+
+            if result.returncode != 0:
+                self.logger.info(f"SSH master connection failed with code {result.returncode}")
+                return False
+            return True
+        except subprocess.TimeoutExpired:
+            self.logger.info("SSH master connection timed out")
+        except Exception as e:
+            self.logger.info(f"SSH master connection error: {e}")
+        return False
+
     def run_ssh_command(self, command: str) -> str:
         """Execute command on remote Pi-hole via SSH"""
+        # Reopen the master if it has gone away; if the Pi-hole can't be reached, don't
+        # spend another connection attempt on the command itself
+        if not self.open_ssh_master():
+            self.logger.info("SSH command skipped, Pi-hole is unreachable")
+            return ""
+
         try:
             result = subprocess.run([
-                'ssh', self.pihole_host, command
+                'ssh', '-o', f'ControlPath={SSH_CONTROL_PATH}', self.pihole_host, command
             ], capture_output=True, text=True, timeout=30)
 
             if result.returncode != 0:
@@ -62,28 +126,31 @@ class PiHoleManager:
         """Get existing CNAME records from Pi-hole"""
         command = "sudo pihole-FTL --config dns.cnameRecords"
         response = self.run_ssh_command(command)
+        self.logger.debug("Raw Pi-hole response: %r", response)
 
         if not response or response == "[]":
             return set()
 
         # Parse Pi-hole format: [ domain1,target1, domain2,target2, ... ]
         # Each record is "domain,target" separated by ", " (comma-space)
-        response = response.strip()
-        if response.startswith('[') and response.endswith(']'):
-            response = response[1:-1]  # Remove brackets
-
-        # Split by ", " to get individual CNAME records
         records = set()
-        if response.strip():
-            # Split by ", " (comma followed by space) to get each domain,target pair
-            parts = response.split(', ')
-            for part in parts:
-                part = part.strip()
-                if part and ',' in part:
-                    records.add(part)
+        for record in _PIHOLE_REC_RE.findall(response):
+            # Aliases match case-insensitively, like the lower-cased domains we compare them to
+            domain, rest = record.split(',', 1)
+            records.add(f"{domain.lower()},{rest}")
 
         return records
 
+    def _cache_is_fresh(self) -> bool:
+        """Check whether the cached CNAME records can be trusted without a fetch"""
+        return (self._cached_existing is not None
+                and time.monotonic() - self._cached_existing_ts < self.cache_ttl)
+
+    def _set_cached_existing(self, records: Set[str]):
+        """Remember the CNAME records currently on the Pi-hole"""
+        self._cached_existing = records
+        self._cached_existing_ts = time.monotonic()
+
     def update_cname_records(self, domains: Set[str]):
         """Update CNAME records on Pi-hole"""
         if not domains:
@@ -92,46 +159,55 @@ class PiHoleManager:
 
         self.logger.info(f"Processing {len(domains)} domains for CNAME records")
 
-        # Get existing records
-        existing_records = self.get_existing_cname_records()
+        candidates = {f"{domain},{self.target_host}" for domain in domains}
 
-        # Build new records list
-        new_records = set(existing_records)  # Start with existing
-        added_count = 0
+        # Skip the SSH fetch when every record is already known to be on the Pi-hole
+        if self._cache_is_fresh() and candidates <= self._cached_existing:
+            self.logger.info("No changes detected")
+            return
 
-        for domain in domains:
-            record = f"{domain},{self.target_host}"
+        existing_records = self.get_existing_cname_records()
+        self._set_cached_existing(existing_records)
 
-            if record in existing_records:
-                self.logger.info(f"CNAME record already exists: {domain} -> {self.target_host}")
-            else:
-                self.logger.info(f"Adding CNAME record: {domain} -> {self.target_host}")
-                new_records.add(record)
-                added_count += 1
+        # Work out only the records that are missing
+        to_add = candidates - existing_records
+        added_count = len(to_add)
+
+        self.logger.info(f"Adding {added_count} new CNAME records; {len(candidates) - added_count} already present")
+        for record in sorted(to_add):
+            domain = record.split(',', 1)[0]
+            self.logger.info(f"Adding CNAME record: {domain} -> {self.target_host}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            for record in sorted(candidates & existing_records):
+                self.logger.debug("CNAME record already exists: %s -> %s", record.split(',', 1)[0], self.target_host)
 
         # Only update if there are changes
-        if added_count > 0:
-            # Format for Pi-hole: [ "item1", "item2", "item3" ]
-            quoted_records = [f'"{record}"' for record in sorted(new_records)]
-            formatted_records = f'[ {", ".join(quoted_records)} ]'
+        if not to_add:
+            self.logger.info("No changes detected")
+            return
 
-            command = f"sudo pihole-FTL --config dns.cnameRecords '{formatted_records}'"
+        # Format for Pi-hole: [ "item1", "item2", "item3" ]
+        new_records = existing_records | to_add
+        formatted_records = '[ "' + '", "'.join(sorted(new_records)) + '" ]'
 
-            if self.testing_mode:
-                self.logger.info(f"[TEST] Would execute: {command}")
-                self.logger.info(f"[TEST] Would update {added_count} CNAME records and restart pihole-FTL")
-            else:
-                result = self.run_ssh_command(command)
-                if result != "":  # Command succeeded (returns empty string on failure)
-                    self.logger.info("CNAME records updated successfully")
-                    self.logger.info(f"Updated {added_count} CNAME records")
-
-                    # Restart pihole-FTL
-                    self.restart_pihole_ftl()
-                else:
-                    self.logger.error(f"Failed to update CNAME records. Command: {command}")
+        command = f"sudo pihole-FTL --config dns.cnameRecords {shlex.quote(formatted_records)}"
+        # Restart pihole-FTL in the same SSH session so the changes apply
+        restart_command = f"{command} && sudo systemctl restart pihole-FTL"
+
+        if self.testing_mode:
+            self.logger.info(f"[TEST] Would execute: {restart_command}")
+            self.logger.info(f"[TEST] Would update {added_count} CNAME records and restart pihole-FTL")
         else:
-            self.logger.info("No changes detected")
+            self.logger.info("Updating CNAME records and restarting pihole-FTL...")
+            result = self.run_ssh_command(restart_command)
+            if result != "":  # Command succeeded (returns empty string on failure)
+                self.logger.info("CNAME records updated successfully")
+                self.logger.info(f"Updated {added_count} CNAME records")
+                self.logger.info("pihole-FTL restarted successfully")
+                self._set_cached_existing(new_records)
+            else:
+                self.logger.error(f"Failed to update CNAME records or restart pihole-FTL. Command: {restart_command}")
+                self._cached_existing = None
 
     def restart_pihole_ftl(self):
         """Restart pihole-FTL service"""